@@ -10,6 +10,19 @@ MQTT_PORT = 1883
 TOPIC_WORD_QUERY = "dictionary/word/query"  # Topic to listen for words from Expo app
 TOPIC_WORD_MEANING = "dictionary/word/meaning"  # Topic to publish meanings back to Expo app
 
+# Delivery: QoS 1 so responses survive reconnects; paho queues them while offline
+PUBLISH_QOS = 1
+MAX_INFLIGHT = 20  # Unacknowledged QoS 1 messages allowed at once
+
+# Compress large meanings ("zstd" or "zlib"); compressed payloads go to TOPIC_WORD_MEANING + "/zstd" etc.
+# Leave as None while the Expo app only understands plain text.
+# Compression needs payload_compression.py (and its dictionary file) copied next to this script.
+PAYLOAD_COMPRESSION = None
+codec = None
+if PAYLOAD_COMPRESSION:
+    from payload_compression import PayloadCodec
+    codec = PayloadCodec(PAYLOAD_COMPRESSION)
+
 
 def on_connect(client, userdata, flags, rc):
     """Callback for when the client connects to the broker."""
@@ -32,19 +45,22 @@ def on_message(client, userdata, message):
             print(f"Looking up meaning for '{word_to_search}'...")
             meaning = get_word_meaning(word_to_search)
 
-            print(f"Publishing meaning to topic: {TOPIC_WORD_MEANING}")
             # Log first 200 chars of meaning if it's long
             log_meaning = meaning if len(meaning) < 200 else meaning[:200] + "..."
             print(f"Meaning snippet: {log_meaning}")
 
-            client.publish(TOPIC_WORD_MEANING, str(meaning))
+            topic, payload = TOPIC_WORD_MEANING, str(meaning)
+            if codec:
+                topic, payload = codec.encode(topic, payload, cache_key=word_to_search.lower())
+            client.publish(topic, payload, qos=PUBLISH_QOS)
+            print(f"Published meaning to {topic}")
         else:
             print("Received an empty message. No word to search.")
-            client.publish(TOPIC_WORD_MEANING, "Error: Received an empty word to search.")
+            client.publish(TOPIC_WORD_MEANING, "Error: Received an empty word to search.", qos=PUBLISH_QOS)
 
     except Exception as e:
         print(f"Error processing message or fetching meaning: {e}")
-        client.publish(TOPIC_WORD_MEANING, f"Error processing request: {e}")
+        client.publish(TOPIC_WORD_MEANING, f"Error processing request: {e}", qos=PUBLISH_QOS)
 
 
 # --- Main script execution ---
@@ -52,6 +68,8 @@ if __name__ == "__main__":
     # MODIFICATION HERE: Specify callback_api_version and client_id
     client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id="DictionaryLookupClient")
 
+    client.max_inflight_messages_set(MAX_INFLIGHT)
+    client.reconnect_delay_set(min_delay=1, max_delay=60)
     client.on_connect = on_connect
     client.on_message = on_message
 
@@ -12,6 +12,10 @@ CLIENT_ID = "LinuxSystemAgentSimpleInput"
 COMMAND_TOPIC = "dictionary/word/query"
 RESPONSE_TOPIC = "dictionary/word/meaning"
 
+# Delivery: QoS 1 so responses survive reconnects; paho queues them while offline
+PUBLISH_QOS = 1
+MAX_INFLIGHT = 20  # Unacknowledged QoS 1 messages allowed at once
+
 # --- Command Execution Functions (mostly unchanged) ---
 
 def execute_command(command_array):
@@ -115,7 +119,7 @@ def on_message(client, userdata, msg):
         "command_echo": command_echo,
         "data": response_data
     }
-    client.publish(RESPONSE_TOPIC, json.dumps(response_payload))
+    client.publish(RESPONSE_TOPIC, json.dumps(response_payload), qos=PUBLISH_QOS)
     print(f"Published response to '{RESPONSE_TOPIC}': {json.dumps(response_payload)}")
 
 
@@ -123,6 +127,8 @@ def on_message(client, userdata, msg):
 if __name__ == "__main__":
     client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, client_id=CLIENT_ID)
     
+    client.max_inflight_messages_set(MAX_INFLIGHT)
+    client.reconnect_delay_set(min_delay=1, max_delay=60)
     client.on_connect = on_connect
     client.on_message = on_message
 
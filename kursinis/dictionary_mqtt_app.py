@@ -1,22 +1,41 @@
-from flask import Flask, jsonify, send_file, render_template_string
+from flask import Blueprint, Flask, jsonify, send_file, render_template_string
 import requests
 import json
-import paho.mqtt.client as mqtt
-import time
+import os
+import socket
+import atexit
 import threading
+import uuid
 from datetime import datetime
+from mqtt_outbox import MqttOutbox
+from payload_compression import PayloadCodec, to_wire_json
+from shared_state import SharedState
 
 # Konfigūracija
 DICTIONARY_API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/"
 MQTT_BROKER = "broker.hivemq.com"
 MQTT_PORT = 1883
 MQTT_TOPIC = "dictionary/words"
-CLIENT_NAME = "dictionary_client_" + str(int(time.time()))
+# Bendra prenumerata: brokeris kiekvieną žinutę pristato tik vienam grupės nariui.
+# Įjungiama tik keliems worker'iams ir su šiam diegimui unikaliu vardu, nes viešame
+# brokeryje į tą pačią grupę patektų visos kitos šios aplikacijos kopijos
+MQTT_SHARED_GROUP = os.environ.get("MQTT_SHARED_GROUP") or None
+CLIENT_PREFIX = "dictionary_client"
+# Dideli atsakymai glaudinami ("zstd" arba "zlib") ir siunčiami į temą su priesaga,
+# pvz. dictionary/words/zstd; None - siunčiama nesuspausta
+PAYLOAD_COMPRESSION = None
 
-app = Flask(__name__)
+bp = Blueprint("dictionary", __name__)
 
-# Globalus kintamasis MQTT žinutėms saugoti
-mqtt_messages = []
+# Žinučių istorija ir žodžių cache bendri visiems worker'iams
+state = SharedState()
+
+# MQTT klientas kuriamas tik prireikus, atskirai kiekvienam procesui
+mqtt_client = None
+mqtt_client_pid = None
+mqtt_client_lock = threading.Lock()
+
+codec = PayloadCodec(PAYLOAD_COMPRESSION)
 
 # HTML šablonas žinučių atvaizdavimui
 HTML_TEMPLATE = """
@@ -100,59 +119,78 @@ def jprint(data):
     text = json.dumps(data, sort_keys=True, indent=4, ensure_ascii=False)
     print(text)
 
+def subscribe_topic(topic=MQTT_TOPIC):
+    """Grąžina prenumeruojamą temą (bendrą, jei nustatyta grupė)"""
+    if MQTT_SHARED_GROUP:
+        return f"$share/{MQTT_SHARED_GROUP}/{topic}"
+    return topic
+
+def make_client_id():
+    """Unikalus kliento ID kiekvienam procesui, kad worker'iai neišmestų vienas kito"""
+    return f"{CLIENT_PREFIX}_{socket.gethostname()}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+
 def on_connect(client, userdata, flags, rc, properties=None):
     """MQTT prisijungimo callback"""
     print(f"Prisijungta prie MQTT brokerio su kodu: {rc}")
-    client.subscribe(MQTT_TOPIC)
-    print(f"Prenumeruojama tema: {MQTT_TOPIC}")
+    # Suspaustos žinutės ateina į temas su priesaga (MQTT_TOPIC/zstd, MQTT_TOPIC/zlib)
+    topics = [subscribe_topic(), subscribe_topic(MQTT_TOPIC + "/+")]
+    client.subscribe([(topic, 0) for topic in topics])
+    print(f"Prenumeruojamos temos: {', '.join(topics)}")
 
 def on_message(client, userdata, msg):
     """MQTT žinutės gavimo callback"""
     try:
-        payload = json.loads(msg.payload.decode())
+        topic, raw = codec.decode(msg.topic, msg.payload)
+        payload = json.loads(raw.decode())
         message_data = {
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "topic": msg.topic,
+            "topic": topic,
             "payload": payload
         }
-        mqtt_messages.append(message_data)
+        # Istorija bendra visiems worker'iams, saugomos tik paskutinės žinutės
+        state.add_message(message_data)
         print(f"Gauta MQTT žinutė iš temos {msg.topic}")
         jprint(payload)
-        
-        # Saugoti tik paskutines 10 žinučių
-        if len(mqtt_messages) > 10:
-            mqtt_messages.pop(0)
             
     except Exception as e:
         print(f"Klaida apdorojant MQTT žinutę: {e}")
 
 def setup_mqtt_client():
-    """Sukuria ir konfigūruoja MQTT klientą"""
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, CLIENT_NAME)
-    client.on_connect = on_connect
-    client.on_message = on_message
-    
-    try:
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        client.loop_start()
-        print("MQTT klientas paleistas")
-        return client
-    except Exception as e:
-        print(f"Nepavyko prisijungti prie MQTT brokerio: {e}")
-        return None
+    """Sukuria ir konfigūruoja MQTT klientą su siunčiamų žinučių eile"""
+    outbox = MqttOutbox(MQTT_BROKER, MQTT_PORT, make_client_id(),
+                        on_connect=on_connect, on_message=on_message)
+    # Prisijungiama fone: jei brokeris nepasiekiamas, žinutės kaupiamos diske
+    outbox.start()
+    print(f"MQTT klientas paleistas (PID {os.getpid()})")
+    return outbox
+
+def get_mqtt_client():
+    """Grąžina šio proceso MQTT klientą, sukurdamas jį pirmo kreipimosi metu"""
+    global mqtt_client, mqtt_client_pid
+    with mqtt_client_lock:
+        # Po fork() tėvinio proceso klientas (ir jo gijos) nebegalioja
+        if mqtt_client is None or mqtt_client_pid != os.getpid():
+            mqtt_client = setup_mqtt_client()
+            mqtt_client_pid = os.getpid()
+            atexit.register(cleanup)
+        return mqtt_client
 
 def lookup_word_api(word):
-    """Ieško žodžio reikšmės naudojant Dictionary API"""
+    """Ieško žodžio reikšmės naudojant Dictionary API; grąžina (duomenys, gavimo laikas)"""
+    cached = state.cache_get(word)
+    if cached is not None:
+        return cached
     try:
         url = f"{DICTIONARY_API_URL}{word}"
         response = requests.get(url, timeout=10)
         
         if response.status_code == 200:
-            return response.json()
+            data = response.json()
+            return data, state.cache_put(word, data)
         else:
-            return {"error": f"Žodis '{word}' nerastas arba API klaida", "status_code": response.status_code}
+            return {"error": f"Žodis '{word}' nerastas arba API klaida", "status_code": response.status_code}, None
     except Exception as e:
-        return {"error": f"API užklausos klaida: {str(e)}"}
+        return {"error": f"API užklausos klaida: {str(e)}"}, None
 
 def save_to_json_file(data, filename="api.json"):
     """Išsaugo duomenis į JSON failą"""
@@ -173,42 +211,56 @@ def save_to_json_file(data, filename="api.json"):
         print(f"Klaida saugant failą: {e}")
         return None
 
-# Inicializuojame MQTT klientą
-mqtt_client = setup_mqtt_client()
+def mqtt_message(saved_data, fetched_at):
+    """MQTT turinys: be glaudinimo - toks pat kaip api.json"""
+    if not codec.codec or fetched_at is None:
+        return saved_data
+    # Glaudinant turinys turi būti vienodas tam pačiam žodžiui, kad suspausta versija
+    # būtų imama iš cache, todėl vietoj kintančio "timestamp" siunčiamas API gavimo laikas
+    message = {"fetched_at": datetime.fromtimestamp(fetched_at).isoformat()}
+    message.update((key, value) for key, value in saved_data.items() if key != "timestamp")
+    return message
+
+@bp.before_app_request
+def ensure_mqtt_client():
+    """Pirmos užklausos metu šiame procese paleidžiamas MQTT klientas"""
+    get_mqtt_client()
 
-@app.route('/')
+@bp.route('/')
 def home():
     """Pagrindinis puslapis"""
     return render_template_string(HTML_TEMPLATE)
 
-@app.route('/lookup/<word>')
+@bp.route('/lookup/<word>')
 def lookup_word(word):
     """API endpoint žodžio paieškai"""
     print(f"Ieškomas žodis: {word}")
     
     # Gauname duomenis iš Dictionary API
-    api_data = lookup_word_api(word)
+    api_data, fetched_at = lookup_word_api(word)
     jprint(api_data)
     
     # Išsaugome į JSON failą
     saved_data = save_to_json_file(api_data)
     
-    # Siunčiame į MQTT, jei klientas prisijungęs
-    if mqtt_client and saved_data:
+    # Įdedame į MQTT siuntimo eilę (išsiunčiama net jei brokeris laikinai nepasiekiamas)
+    if saved_data:
         try:
-            mqtt_client.publish(MQTT_TOPIC, json.dumps(saved_data))
-            print(f"Duomenys išsiųsti į MQTT temą: {MQTT_TOPIC}")
+            topic, data = codec.encode(MQTT_TOPIC, to_wire_json(mqtt_message(saved_data, fetched_at)),
+                                       cache_key=word.lower())
+            get_mqtt_client().publish(topic, data)
+            print(f"Duomenys įdėti į MQTT temos eilę: {topic} ({len(data)} B)")
         except Exception as e:
             print(f"MQTT siuntimo klaida: {e}")
     
     return jsonify(api_data)
 
-@app.route('/search/<word>')
+@bp.route('/search/<word>')
 def search_word_demo(word):
     """Demonstracinis endpoint - iš karto atlieka paiešką ir atvaizdavimą"""
     return lookup_word(word)
 
-@app.route('/api')
+@bp.route('/api')
 def send_api_file():
     """Siunčia JSON failą atsisiuntimui"""
     try:
@@ -216,20 +268,26 @@ def send_api_file():
     except FileNotFoundError:
         return jsonify({"error": "api.json failas nerastas. Pirmiau atlikite žodžio paiešką."}), 404
 
-@app.route('/mqtt_messages_json')
+@bp.route('/mqtt_messages_json')
 def get_mqtt_messages_json():
     """Grąžina MQTT žinutes JSON formatu"""
-    return jsonify(mqtt_messages)
+    return jsonify(state.messages())
 
-@app.route('/mqtt_messages')
+@bp.route('/mqtt_messages')
 def get_mqtt_messages():
     """Atvaizdoja MQTT žinutes"""
+    messages = state.messages()
     return jsonify({
-        "total_messages": len(mqtt_messages),
-        "messages": mqtt_messages
+        "total_messages": len(messages),
+        "messages": messages
     })
 
-@app.route('/test_mqtt')
+@bp.route('/compression_stats')
+def get_compression_stats():
+    """Grąžina šio proceso glaudinimo statistiką (sutaupyti baitai, CPU laikas)"""
+    return jsonify(codec.stats())
+
+@bp.route('/test_mqtt')
 def test_mqtt():
     """Testuoja MQTT siuntimą"""
     test_message = {
@@ -238,34 +296,52 @@ def test_mqtt():
         "message": "Test žinutė iš Flask aplikacijos"
     }
     
-    if mqtt_client:
-        try:
-            mqtt_client.publish(MQTT_TOPIC, json.dumps(test_message))
-            return jsonify({"status": "success", "message": "Test žinutė išsiųsta į MQTT"})
-        except Exception as e:
-            return jsonify({"status": "error", "message": f"MQTT klaida: {e}"})
-    else:
-        return jsonify({"status": "error", "message": "MQTT klientas neprisijungęs"})
+    client = get_mqtt_client()
+    try:
+        client.publish(MQTT_TOPIC, json.dumps(test_message))
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"MQTT klaida: {e}"})
+
+    if client.is_connected():
+        return jsonify({"status": "success", "message": "Test žinutė išsiųsta į MQTT"})
+    return jsonify({
+        "status": "queued",
+        "message": "MQTT brokeris nepasiekiamas, žinutė bus išsiųsta prisijungus",
+        "pending": client.pending()
+    })
 
 def cleanup():
     """Išvaloma išteklius"""
-    if mqtt_client:
-        mqtt_client.loop_stop()
-        mqtt_client.disconnect()
-        print("MQTT klientas atjungtas")
+    global mqtt_client
+    with mqtt_client_lock:
+        if mqtt_client is None or mqtt_client_pid != os.getpid():
+            return
+        mqtt_client.stop()
+        mqtt_client = None
+    print("MQTT klientas atjungtas")
+
+def create_app():
+    """Flask aplikacijos gamykla - importuojant ir kuriant neprisijungiama prie tinklo.
+
+    Paleidimas su keliais worker'iais, pvz.:
+        MQTT_SHARED_GROUP=mano_diegimas_123 gunicorn -w 4 'dictionary_mqtt_app:create_app()'
+    """
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return app
 
 if __name__ == '__main__':
     try:
         print("=== Dictionary API + MQTT Integration prasideda ===")
         print(f"MQTT Broker: {MQTT_BROKER}")
         print(f"MQTT Topic: {MQTT_TOPIC}")
-        print(f"Client Name: {CLIENT_NAME}")
+        print(f"MQTT prenumerata: {subscribe_topic()}")
         print("Aplankykite http://localhost:5000 naršyklėje")
         print("Pavyzdžiui, ieškokite žodžio: http://localhost:5000/lookup/hello")
         print("=" * 50)
         
         # Paleidžiame Flask aplikaciją
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        create_app().run(debug=True, host='0.0.0.0', port=5000)
         
     except KeyboardInterrupt:
         print("\nPrograma sustabdyta")
@@ -0,0 +1,252 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+import paho.mqtt.client as mqtt
+
+# Konfigūracija
+SPOOL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mqtt_outbox.db")
+PUBLISH_QOS = 1
+MAX_INFLIGHT = 20       # Kiek QoS 1 žinučių gali laukti PUBACK vienu metu
+REPLAY_BATCH = 100      # Kiek žinučių iš disko persiunčiama vienu kartu
+MEMORY_LIMIT = 1000     # Atmintyje laikomų žinučių riba, po jos rašoma į diską
+CLAIM_TIMEOUT = 60      # Po kiek sekundžių kito proceso užimtas eilutes galima perimti
+
+
+class MqttOutbox:
+    """Siunčiamų MQTT žinučių eilė: atmintis -> diskas, QoS 1 ir automatinis persijungimas"""
+
+    def __init__(self, broker, port, client_id, spool_file=SPOOL_FILE, qos=PUBLISH_QOS,
+                 max_inflight=MAX_INFLIGHT, replay_batch=REPLAY_BATCH, memory_limit=MEMORY_LIMIT,
+                 on_connect=None, on_message=None):
+        self.broker = broker
+        self.port = port
+        self.qos = qos
+        self.max_inflight = max_inflight
+        self.replay_batch = replay_batch
+        self.user_on_connect = on_connect
+
+        self.memory = queue.Queue(maxsize=memory_limit)
+        # Žinutės, netilpusios į atmintį; į diską jas įrašo siuntimo gija, ne publish()
+        self.overflow = deque()
+        self.connected = threading.Event()
+        self.running = threading.Event()
+        self.lock = threading.Lock()
+        # PUBACK gauti mid; apdorojami siuntimo gijoje, kad nereikėtų paho užraktų
+        self.acks = queue.Queue()
+        # mid -> (spool eilutės id arba None, tema, turinys)
+        self.inflight = {}
+        # PUBACK, atėję anksčiau nei mid buvo užregistruotas
+        self.early_acks = set()
+        self.replay_from = 0
+
+        # Tą patį spool failą gali naudoti keli procesai; eilutes persiunčia jas užėmęs procesas
+        self.owner = uuid.uuid4().hex
+        self.spool = sqlite3.connect(spool_file, timeout=10, check_same_thread=False)
+        self.spool.execute("pragma journal_mode = wal")
+        self.spool.execute("create table if not exists outbox ("
+                           "id integer primary key autoincrement, topic text, payload blob, "
+                           "owner text, claimed_at real)")
+        self.spool.commit()
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id)
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        if on_message:
+            self.client.on_message = on_message
+
+        self.sender = threading.Thread(target=self._sender_loop, name="mqtt-outbox", daemon=True)
+
+    def start(self):
+        """Paleidžia prisijungimą fone - neblokuoja, net jei brokeris nepasiekiamas"""
+        self.running.set()
+        self.client.connect_async(self.broker, self.port, 60)
+        self.client.loop_start()
+        self.sender.start()
+
+    def stop(self):
+        """Sustabdo siuntimą; neišsiųstos žinutės lieka diske kitam paleidimui"""
+        self.running.clear()
+        self.sender.join(timeout=5)
+        # Eilės saugios kelioms gijoms, jų turinį išsaugome bet kuriuo atveju
+        self._drain_memory_to_spool()
+        if self.sender.is_alive():
+            # Siuntimo gija vis dar naudoja inflight ir spool, todėl jų neliečiame
+            print("MQTT siuntimo gija nesustojo laiku, spool failas paliekamas atidarytas")
+        else:
+            self._process_acks()
+            # Nepatvirtintas žinutes, kurių nėra diske, irgi išsaugome
+            unacked = [(topic, payload) for row_id, topic, payload in self.inflight.values() if row_id is None]
+            if unacked:
+                self._spool_write(unacked)
+        self.client.loop_stop()
+        self.client.disconnect()
+        if not self.sender.is_alive():
+            with self.lock:
+                self.spool.close()
+
+    def publish(self, topic, payload):
+        """Įdeda žinutę į eilę ir iškart grąžina valdymą"""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        try:
+            self.memory.put_nowait((topic, payload))
+        except queue.Full:
+            self.overflow.append((topic, payload))
+
+    def is_connected(self):
+        return self.connected.is_set()
+
+    def pending(self):
+        """Grąžina dar neišsiųstų žinučių skaičių (atmintyje, diske ir laukiančių PUBACK)"""
+        with self.lock:
+            on_disk = self.spool.execute("select count(*) from outbox").fetchone()[0]
+        unacked = sum(1 for entry in list(self.inflight.values()) if entry[0] is None)
+        return self.memory.qsize() + len(self.overflow) + on_disk + unacked
+
+    # --- MQTT callbacks ---
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if not reason_code.is_failure:
+            with self.lock:
+                self.replay_from = 0
+            self.connected.set()
+        if self.user_on_connect:
+            self.user_on_connect(client, userdata, flags, reason_code, properties)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        self.connected.clear()
+        print(f"MQTT ryšys nutrūko ({reason_code}), žinutės kaupiamos diske")
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        self.acks.put(mid)
+
+    # --- Siuntimo gija ---
+
+    def _sender_loop(self):
+        while self.running.is_set():
+            self._process_acks()
+            self._drain_overflow_to_spool()
+            if not self.connected.wait(timeout=1):
+                self._drain_memory_to_spool()
+                continue
+            if self._replay_spool():
+                continue
+            try:
+                topic, payload = self.memory.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if not self._send(topic, payload, None):
+                self._spool_write([(topic, payload)])
+
+    def _replay_spool(self):
+        """Persiunčia vieną paketą žinučių iš disko; grąžina True, jei kažkas buvo išsiųsta"""
+        with self.lock:
+            now = time.time()
+            self.spool.execute(
+                "update outbox set owner = ?, claimed_at = ? where id in ("
+                "select id from outbox where id > ? and (owner is null or owner = ? or claimed_at < ?) "
+                "order by id limit ?)",
+                (self.owner, now, self.replay_from, self.owner, now - CLAIM_TIMEOUT, self.replay_batch))
+            self.spool.commit()
+            rows = self.spool.execute(
+                "select id, topic, payload from outbox where owner = ? and id > ? order by id limit ?",
+                (self.owner, self.replay_from, self.replay_batch)).fetchall()
+        if not rows:
+            return False
+        waiting = {entry[0] for entry in list(self.inflight.values())}
+        sent = 0
+        for row_id, topic, payload in rows:
+            if row_id not in waiting:
+                if not self._send(topic, payload, row_id):
+                    break
+                sent += 1
+            with self.lock:
+                self.replay_from = row_id
+        if sent:
+            print(f"Iš disko persiųsta {sent} MQTT žinučių")
+        return sent > 0
+
+    def _send(self, topic, payload, row_id):
+        # Laukiame laisvos vietos in-flight lange, kad nebūtų perpildytas brokeris
+        while self.qos > 0 and len(self.inflight) >= self.max_inflight:
+            if not self.connected.is_set() or not self.running.is_set():
+                return False
+            self._drain_overflow_to_spool()
+            try:
+                self._ack(self.acks.get(timeout=1))
+            except queue.Empty:
+                continue
+
+        info = self.client.publish(topic, payload, qos=self.qos)
+        # Be ryšio paho pats pasilieka QoS 1 žinutę ir išsiunčia ją prisijungus
+        if info.rc == mqtt.MQTT_ERR_SUCCESS or (info.rc == mqtt.MQTT_ERR_NO_CONN and self.qos > 0):
+            if self.qos > 0:
+                self.inflight[info.mid] = (row_id, topic, payload)
+                if info.mid in self.early_acks:
+                    self.early_acks.discard(info.mid)
+                    self._ack(info.mid)
+            elif row_id is not None:
+                self._spool_delete([row_id])
+            return True
+        return False
+
+    def _ack(self, mid, done=None):
+        if mid not in self.inflight:
+            self.early_acks.add(mid)
+            return
+        row_id = self.inflight.pop(mid)[0]
+        if row_id is None:
+            return
+        if done is None:
+            self._spool_delete([row_id])
+        else:
+            done.append(row_id)
+
+    def _process_acks(self):
+        # Patvirtintas disko eilutes triname vienu commit
+        done = []
+        while True:
+            try:
+                self._ack(self.acks.get_nowait(), done)
+            except queue.Empty:
+                break
+        if done:
+            self._spool_delete(done)
+
+    def _drain_memory_to_spool(self):
+        items = []
+        while True:
+            try:
+                items.append(self.memory.get_nowait())
+            except queue.Empty:
+                break
+        if items:
+            self._spool_write(items)
+        self._drain_overflow_to_spool()
+
+    def _drain_overflow_to_spool(self):
+        items = []
+        while True:
+            try:
+                items.append(self.overflow.popleft())
+            except IndexError:
+                break
+        if items:
+            self._spool_write(items)
+
+    def _spool_write(self, items):
+        with self.lock:
+            self.spool.executemany("insert into outbox (topic, payload) values (?, ?)", items)
+            self.spool.commit()
+
+    def _spool_delete(self, row_ids):
+        with self.lock:
+            self.spool.executemany("delete from outbox where id = ?", [(i,) for i in row_ids])
+            self.spool.commit()
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Konfigūracija
+COMPRESS_THRESHOLD = 1024   # Mažesni nei tiek baitų turiniai siunčiami nesuspausti
+CACHE_SIZE = 256            # Kiek suspaustų žodžių laikyti atmintyje
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+# Suspaustų žinučių tema gauna priesagą, pvz. dictionary/words/zstd
+TOPIC_SUFFIXES = {"zstd": "/zstd", "zlib": "/zlib"}
+
+# Apmokytas žodynas (python payload_compression.py train); jei failo nėra - PRESET_DICTIONARY
+DICTIONARY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionary_entries.zdict")
+ZLIB_DICT_SIZE = 32 * 1024  # zlib naudoja tik paskutinius 32 KB žodyno
+MAX_DECOMPRESSED = 1024 * 1024  # Didesni išskleisti turiniai atmetami (apsauga nuo "zip bomb")
+
+# Bendras žodynas (preset dictionary) iš dažniausių Dictionary API ir suformatuoto
+# teksto fragmentų. Abi pusės turi naudoti tą patį - jį pakeitus keičiasi ir formatas.
+# Fragmentai atitinka to_wire_json() formatą (be tarpų po "," ir ":").
+# Dažniausi fragmentai gale, nes zlib juos pasiekia trumpesniais atstumais.
+PRESET_DICTIONARY = (
+    '{"name":"CC BY-SA 3.0","url":"https://creativecommons.org/licenses/by-sa/3.0"}'
+    '"sourceUrl":"https://commons.wikimedia.org/w/index.php?curid='
+    '"audio":"https://api.dictionaryapi.dev/media/pronunciations/en/'
+    '"sourceUrls":["https://en.wiktionary.org/wiki/'
+    '"license":{"name":"CC BY-SA 3.0","url":"https://creativecommons.org/licenses/by-sa/3.0"}'
+    '"phonetics":[{"text":"/'
+    '"timestamp":"2025-01-01T00:00:00.000000","source":"Dictionary API",'
+    '"client_info":"Python Dictionary MQTT Integration","data":[{"word":"'
+    '--- Alternative Entry for Word: Phonetic: /'
+    '\nAs Interjection:\n  1. \nAs Adverb:\n  1. \nAs Adjective:\n  1. \nAs Verb:\n  1. \nAs Noun:\n  1. '
+    '"partOfSpeech":"interjection""partOfSpeech":"adverb""partOfSpeech":"adjective"'
+    '"partOfSpeech":"verb","definitions":[{"definition":"'
+    '"meanings":[{"partOfSpeech":"noun","definitions":[{"definition":"'
+    '"example":"'
+    '\n     Example: "'
+    ' of the or to a an in for is that which with by as on from something someone used '
+    '"synonyms":[],"antonyms":[]},{"definition":"'
+    '","synonyms":[],"antonyms":[]}'
+).encode("utf-8")
+
+
+def to_wire_json(data):
+    """JSON be tarpų ir be \\u kodavimo - tokiu formatu apmokytas žodynas"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def load_dictionary():
+    """Grąžina apmokytą žodyną iš DICTIONARY_FILE arba įtaisytą PRESET_DICTIONARY"""
+    if os.path.exists(DICTIONARY_FILE):
+        with open(DICTIONARY_FILE, "rb") as f:
+            return f.read()
+    return PRESET_DICTIONARY
+
+
+def train_dictionary(samples, size=16 * 1024):
+    """Apmoko zstd žodyną iš tikrų (to_wire_json) atsakymų ir išsaugo į DICTIONARY_FILE"""
+    if zstandard is None:
+        raise RuntimeError("Žodyno apmokymui reikia zstandard paketo")
+    trained = zstandard.train_dictionary(size, samples)
+    with open(DICTIONARY_FILE, "wb") as f:
+        f.write(trained.as_bytes())
+    return trained
+
+
+def available_codecs():
+    """Grąžina šioje aplinkoje galimus glaudinimo algoritmus"""
+    return ["zstd", "zlib"] if zstandard else ["zlib"]
+
+
+class PayloadCodec:
+    """Didelių MQTT turinių glaudinimas su bendru žodynu ir cache kiekvienam žodžiui"""
+
+    def __init__(self, codec="zstd", threshold=COMPRESS_THRESHOLD, cache_size=CACHE_SIZE,
+                 max_decompressed=MAX_DECOMPRESSED):
+        if codec == "zstd" and zstandard is None:
+            print("zstandard paketas neįdiegtas, naudojamas zlib")
+            codec = "zlib"
+        if codec not in (None, "zstd", "zlib"):
+            raise ValueError(f"Nežinomas glaudinimo algoritmas: {codec}")
+        self.codec = codec
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.max_decompressed = max_decompressed
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"messages": 0, "compressed": 0, "cache_hits": 0, "compress_attempts": 0,
+                         "bytes_in": 0, "bytes_out": 0, "compress_cpu_seconds": 0.0}
+        # zstd kontekstai nėra saugūs kelioms gijoms, todėl kiekviena gija turi savo
+        self.local = threading.local()
+        self.dictionary = load_dictionary()
+        self.zlib_dict = self.dictionary[-ZLIB_DICT_SIZE:]
+        self.zstd_dict = None
+        if zstandard:
+            # Apmokytas žodynas turi zstd antraštę, įtaisytas - tik turinys
+            self.zstd_dict = zstandard.ZstdCompressionDict(self.dictionary, dict_type=zstandard.DICT_TYPE_AUTO)
+
+    def encode(self, topic, payload, cache_key=None):
+        """Grąžina (tema, turinys); suspaudžia tik jei turinys didesnis už slenkstį"""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if self.codec is None or len(payload) < self.threshold:
+            with self.lock:
+                self._count(len(payload), len(payload))
+            return topic, payload
+
+        # Populiarūs žodžiai suspaudžiami vieną kartą; digest apsaugo nuo pasenusio turinio
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        key = cache_key if cache_key is not None else digest
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached[0] == digest:
+                self.cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                self._count(len(payload), len(cached[1]), compressed=True)
+                return topic + TOPIC_SUFFIXES[self.codec], cached[1]
+
+        # Matuojamas šios gijos CPU laikas, ne sieninis laikas
+        start = time.thread_time()
+        data = self._compress(payload)
+        elapsed = time.thread_time() - start
+
+        # Jei glaudinimas nieko nedavė, siunčiame originalą
+        if len(data) >= len(payload):
+            with self.lock:
+                self._count(len(payload), len(payload), seconds=elapsed)
+            return topic, payload
+
+        with self.lock:
+            self.cache[key] = (digest, data)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            self._count(len(payload), len(data), seconds=elapsed, compressed=True)
+        return topic + TOPIC_SUFFIXES[self.codec], data
+
+    def decode(self, topic, payload):
+        """Grąžina (pradinė tema, išskleistas turinys) pagal temos priesagą"""
+        for codec, suffix in TOPIC_SUFFIXES.items():
+            if topic.endswith(suffix):
+                return topic[:-len(suffix)], self._decompress(codec, payload)
+        return topic, payload
+
+    def stats(self):
+        """Sutaupytų baitų ir CPU laiko statistika"""
+        with self.lock:
+            stats = dict(self.counters)
+        stats["codec"] = self.codec
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None
+        # Dalinama iš visų bandymų, įskaitant tuos, kurių rezultatas nebuvo mažesnis
+        attempts = stats["compress_attempts"]
+        stats["compress_cpu_us_per_attempt"] = (
+            round(stats["compress_cpu_seconds"] / attempts * 1e6, 1) if attempts else None)
+        return stats
+
+    def _count(self, size_in, size_out, seconds=None, compressed=False):
+        # Kviečiama laikant self.lock; seconds perduodamas tik tikrai bandžius suspausti
+        self.counters["messages"] += 1
+        if seconds is not None:
+            self.counters["compress_attempts"] += 1
+            self.counters["compress_cpu_seconds"] += seconds
+        self.counters["bytes_in"] += size_in
+        self.counters["bytes_out"] += size_out
+        if compressed:
+            self.counters["compressed"] += 1
+
+    def _compress(self, payload):
+        if self.codec == "zstd":
+            compressor = getattr(self.local, "compressor", None)
+            if compressor is None:
+                compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=self.zstd_dict)
+                self.local.compressor = compressor
+            return compressor.compress(payload)
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=self.zlib_dict)
+        return compressor.compress(payload) + compressor.flush()
+
+    def _decompress(self, codec, payload):
+        # Išskleidžiama ne daugiau nei max_decompressed baitų - temos viešame brokeryje
+        # gali rašyti bet kas, todėl antraštėje nurodytu dydžiu nepasitikime
+        limit = self.max_decompressed
+        if codec == "zstd":
+            if zstandard is None:
+                raise ValueError("Gauta zstd žinutė, bet zstandard paketas neįdiegtas")
+            decompressor = getattr(self.local, "decompressor", None)
+            if decompressor is None:
+                decompressor = zstandard.ZstdDecompressor(dict_data=self.zstd_dict)
+                self.local.decompressor = decompressor
+            # Mūsų kadrai visada turi dydį antraštėje; be jo nepilnas kadras išsiskleistų iš dalies
+            expected = zstandard.frame_content_size(payload)
+            if expected < 0:
+                raise ValueError("Suspaustame turinyje nenurodytas dydis, žinutė atmesta")
+            if expected > limit:
+                raise ValueError(f"Išskleistas turinys viršija {limit} B, žinutė atmesta")
+            # zstd neleidžia išskleisti daugiau nei nurodyta antraštėje
+            stream = decompressor.decompressobj()
+            data = stream.decompress(payload)
+            if not stream.eof or stream.unused_data or len(data) != expected:
+                raise ValueError("Sugadintas arba nepilnas suspaustas turinys")
+            return data
+        decompressor = zlib.decompressobj(zdict=self.zlib_dict)
+        data = decompressor.decompress(payload, limit)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"Išskleistas turinys viršija {limit} B, žinutė atmesta")
+        if not decompressor.eof:
+            raise ValueError("Sugadintas arba nepilnas suspaustas turinys")
+        return data
+
+
+def measure(payloads, repeat=20):
+    """Palygina algoritmus su bendru žodynu ir be jo: dydis ir CPU laikas"""
+    total = sum(len(p) for p in payloads)
+    variants = [("zlib", lambda p: zlib.compress(p, ZLIB_LEVEL)),
+                ("zlib+dict", PayloadCodec("zlib", threshold=0)._compress)]
+    if zstandard:
+        variants.append(("zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress))
+        variants.append(("zstd+dict", PayloadCodec("zstd", threshold=0)._compress))
+
+    results = []
+    for name, compress in variants:
+        size = sum(len(compress(p)) for p in payloads)
+        start = time.process_time()
+        for _ in range(repeat):
+            for p in payloads:
+                compress(p)
+        elapsed = (time.process_time() - start) / (repeat * len(payloads))
+        results.append({"codec": name, "bytes_in": total, "bytes_out": size,
+                        "saved_percent": round(100 * (1 - size / total), 1),
+                        "cpu_us_per_message": round(elapsed * 1e6, 1)})
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    import requests
+
+    # python payload_compression.py [train]
+    words = ["hello", "set", "run", "take", "light", "place", "time", "good", "water", "make",
+             "go", "get", "work", "play", "house", "book", "hand", "head", "line", "point",
+             "right", "state", "turn", "back", "call", "cut", "break", "open", "form", "mark"]
+    payloads = []
+    for word in words:
+        response = requests.get(f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}", timeout=10)
+        if response.status_code == 200:
+            payloads.append(to_wire_json(response.json()).encode("utf-8"))
+
+    if sys.argv[1:] == ["train"]:
+        train_dictionary(payloads)
+        print(f"Žodynas apmokytas iš {len(payloads)} atsakymų ir išsaugotas į {DICTIONARY_FILE}")
+
+    print(f"Žodžių: {len(payloads)}, vidutinis dydis: {sum(map(len, payloads)) // max(len(payloads), 1)} B")
+    for row in measure(payloads):
+        print(f"{row['codec']:>10}: {row['bytes_in']} -> {row['bytes_out']} B "
+              f"({row['saved_percent']}% mažiau), {row['cpu_us_per_message']} µs CPU/žinutei")
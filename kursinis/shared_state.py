@@ -0,0 +1,83 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Konfigūracija
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionary_state.db")
+HISTORY_LIMIT = 10          # Kiek paskutinių MQTT žinučių saugoti
+CACHE_TTL = 24 * 60 * 60    # Kiek sekundžių laikomas Dictionary API atsakymas
+
+SCHEMA = """
+create table if not exists mqtt_messages (
+  id integer primary key autoincrement,
+  timestamp text,
+  topic text,
+  payload text
+);
+
+create table if not exists word_cache (
+  word text primary key,
+  fetched_at real,
+  data text
+);
+"""
+
+
+class SharedState:
+    """Bendra visiems procesams (worker'iams) būsena SQLite faile"""
+
+    def __init__(self, path=STATE_FILE, history_limit=HISTORY_LIMIT, cache_ttl=CACHE_TTL):
+        self.path = path
+        self.history_limit = history_limit
+        self.cache_ttl = cache_ttl
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def _connection(self):
+        # Po fork() SQLite jungties naudoti negalima, todėl kiekvienas procesas atsidaro savo
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self.conn.execute("pragma journal_mode = wal")
+            self.conn.executescript(SCHEMA)
+            self.pid = os.getpid()
+        return self.conn
+
+    def add_message(self, message_data):
+        """Įrašo gautą MQTT žinutę ir palieka tik paskutines history_limit"""
+        with self.lock:
+            conn = self._connection()
+            conn.execute("insert into mqtt_messages (timestamp, topic, payload) values (?, ?, ?)",
+                         (message_data["timestamp"], message_data["topic"],
+                          json.dumps(message_data["payload"], ensure_ascii=False)))
+            conn.execute("delete from mqtt_messages where id <= "
+                         "(select max(id) from mqtt_messages) - ?", (self.history_limit,))
+            conn.commit()
+
+    def messages(self):
+        """Grąžina paskutines MQTT žinutes nuo seniausios iki naujausios"""
+        with self.lock:
+            rows = self._connection().execute(
+                "select timestamp, topic, payload from mqtt_messages order by id").fetchall()
+        return [{"timestamp": ts, "topic": topic, "payload": json.loads(payload)}
+                for ts, topic, payload in rows]
+
+    def cache_get(self, word):
+        """Grąžina (Dictionary API atsakymas, gavimo laikas) arba None"""
+        with self.lock:
+            row = self._connection().execute(
+                "select data, fetched_at from word_cache where word = ? and fetched_at >= ?",
+                (word.lower(), time.time() - self.cache_ttl)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def cache_put(self, word, data):
+        """Išsaugo atsakymą ir grąžina jo gavimo laiką"""
+        fetched_at = time.time()
+        with self.lock:
+            conn = self._connection()
+            conn.execute("insert or replace into word_cache (word, fetched_at, data) values (?, ?, ?)",
+                         (word.lower(), fetched_at, json.dumps(data, ensure_ascii=False)))
+            conn.commit()
+        return fetched_at
@@ -1,10 +1,16 @@
 import sqlite3
 import paho.mqtt.client as mqtt
 import json
+import time
+from analytics import StreamingDetector, publish_anomalies
+from dedup import SlidingWindowDedup, make_key
 
 MQTT_Topic = "Home/BedRoom/18/#"
 mqttBroker ="broker.hivemq.com"
 
+# Seconds between streaming analytics runs over ingested readings
+BATCH_Interval = 5
+
 # SQLite DB Name
 DB_Name =  "IoT.db"
 
@@ -17,6 +23,7 @@ create table Temperature_Data (
   Date_n_Time text,
   Temperature text
 );
+create unique index Temperature_Data_Reading on Temperature_Data (SensorID, Date_n_Time, Temperature);
 
 
 drop table if exists Humidity_Data ;
@@ -26,6 +33,7 @@ create table Humidity_Data (
   Date_n_Time text,
   Humidity text
 );
+create unique index Humidity_Data_Reading on Humidity_Data (SensorID, Date_n_Time, Humidity);
 
 drop table if exists Pressure_Data ;
 create table Pressure_Data (
@@ -34,8 +42,15 @@ create table Pressure_Data (
   Date_n_Time text,
   Pressure text
 );
+create unique index Pressure_Data_Reading on Pressure_Data (SensorID, Date_n_Time, Pressure);
 """
 
+# Streaming anomaly detector fed by the ingest handlers
+detector = StreamingDetector()
+
+# Drops QoS 1 redeliveries and readings seen by several sniffers before they reach the DB
+dedup = SlidingWindowDedup()
+
 class DatabaseManager():
 	def __init__(self):
 		self.conn = sqlite3.connect(DB_Name)
@@ -46,7 +61,7 @@ class DatabaseManager():
 	def add_del_update_db_record(self, sql_query, args=()):
 		self.cur.execute(sql_query, args)
 		self.conn.commit()
-		return
+		return self.cur.rowcount
 
 	def __del__(self):
 		self.cur.close()
@@ -73,9 +88,19 @@ def Temp_Data_Handler(jsonData):
 	Data_and_Time = json_Dict['Date']
 	try:
 		Temperature = json_Dict['Temperature']
+		key = make_key("Temperature", SensorID, Data_and_Time, Temperature)
+		if dedup.is_duplicate(key):
+			print("Duplicate Temperature Data, skipped inserting to DB")
+			return
 		dbObj = DatabaseManager()
-		dbObj.add_del_update_db_record("insert into Temperature_Data (SensorID, Date_n_Time, Temperature) values (?,?,?)",[SensorID, Data_and_Time, Temperature])
+		inserted = dbObj.add_del_update_db_record("insert or ignore into Temperature_Data (SensorID, Date_n_Time, Temperature) values (?,?,?)",[SensorID, Data_and_Time, Temperature])
 		del dbObj
+		dedup.remember(key)
+		if not inserted:
+			dedup.count_db_duplicate()
+			print("Duplicate Temperature Data already in Database, skipped.")
+			return
+		detector.add("Temperature", SensorID, Data_and_Time, Temperature)
 		print("Inserted Temperature Data into Database.")
 	except:
 		print("wrong payload, skipped inserting to DB")
@@ -89,9 +114,19 @@ def Humidity_Data_Handler(jsonData):
 	Data_and_Time = json_Dict['Date']
 	try:
 		Humidity = json_Dict['Humidity']
+		key = make_key("Humidity", SensorID, Data_and_Time, Humidity)
+		if dedup.is_duplicate(key):
+			print("Duplicate Humidity Data, skipped inserting to DB")
+			return
 		dbObj = DatabaseManager()
-		dbObj.add_del_update_db_record("insert into Humidity_Data (SensorID, Date_n_Time, Humidity) values (?,?,?)",[SensorID, Data_and_Time, Humidity])
+		inserted = dbObj.add_del_update_db_record("insert or ignore into Humidity_Data (SensorID, Date_n_Time, Humidity) values (?,?,?)",[SensorID, Data_and_Time, Humidity])
 		del dbObj
+		dedup.remember(key)
+		if not inserted:
+			dedup.count_db_duplicate()
+			print("Duplicate Humidity Data already in Database, skipped.")
+			return
+		detector.add("Humidity", SensorID, Data_and_Time, Humidity)
 		print("Inserted Humidity Data into Database.")
 	except:
 		print("wrong payload, skipped inserting to DB")
@@ -104,9 +139,19 @@ def Pressure_Data_Handler(jsonData):
 	Data_and_Time = json_Dict['Date']
 	try:
 		Pressure = json_Dict['Pressure']
+		key = make_key("Pressure", SensorID, Data_and_Time, Pressure)
+		if dedup.is_duplicate(key):
+			print("Duplicate Pressure Data, skipped inserting to DB")
+			return
 		dbObj = DatabaseManager()
-		dbObj.add_del_update_db_record("insert into Pressure_Data (SensorID, Date_n_Time, Pressure) values (?,?,?)",[SensorID, Data_and_Time, Pressure])
+		inserted = dbObj.add_del_update_db_record("insert or ignore into Pressure_Data (SensorID, Date_n_Time, Pressure) values (?,?,?)",[SensorID, Data_and_Time, Pressure])
 		del dbObj
+		dedup.remember(key)
+		if not inserted:
+			dedup.count_db_duplicate()
+			print("Duplicate Pressure Data already in Database, skipped.")
+			return
+		detector.add("Pressure", SensorID, Data_and_Time, Pressure)
 		print("Inserted Pressure Data into Database.")
 	except:
 		print("wrong payload, skipped inserting to DB")
@@ -133,4 +178,17 @@ if __name__ == "__main__":
 	client.subscribe(MQTT_Topic)
 	print("Subscribed")
 	client.on_message=on_message
-	client.loop_forever() 
\ No newline at end of file
+	client.loop_start()
+	last_received = 0
+	try:
+		while True:
+			time.sleep(BATCH_Interval)
+			publish_anomalies(client, detector.flush())
+			stats = dedup.stats()
+			if stats["received"] != last_received:
+				last_received = stats["received"]
+				print("Dedup: %d received, %d duplicates in window, %d in DB, duplicate rate %.1f%%" % (
+					stats["received"], stats["window_duplicates"], stats["db_duplicates"], 100 * stats["duplicate_rate"]))
+	except KeyboardInterrupt:
+		client.loop_stop()
+		client.disconnect()
@@ -0,0 +1,254 @@
+import sqlite3
+import threading
+import json
+import numpy as np
+
+# SQLite DB Name
+DB_Name = "IoT.db"
+
+# Metric name -> (table, value column)
+Metric_Tables = {
+	"Temperature": ("Temperature_Data", "Temperature"),
+	"Humidity": ("Humidity_Data", "Humidity"),
+	"Pressure": ("Pressure_Data", "Pressure"),
+}
+
+# Topic the detected anomalies are published to
+ALERT_Topic = "Home/BedRoom/18/Alerts"
+
+# Detector settings
+WINDOW = 30
+Z_THRESHOLD = 4.0
+EWMA_ALPHA = 0.1
+EWMA_THRESHOLD = 4.0
+
+# (1 - alpha) ** -n must stay finite inside one EWMA block
+_MAX_EXPONENT = 500.0
+
+
+def _to_float(value):
+	try:
+		return float(value)
+	except (TypeError, ValueError):
+		return np.nan
+
+def _to_seconds(dates):
+	# ISO dates/timestamps -> float seconds since epoch, NaN if unparsable
+	try:
+		return np.array(dates, dtype="datetime64[s]").astype(np.float64)
+	except ValueError:
+		out = np.empty(len(dates))
+		for i, d in enumerate(dates):
+			try:
+				out[i] = np.datetime64(d, "s").astype(np.float64)
+			except ValueError:
+				out[i] = np.nan
+		return out
+
+# Load one metric from the DB, grouped per sensor as NumPy arrays
+def load_window(metric, since=None, until=None, db_name=DB_Name):
+	table, column = Metric_Tables[metric]
+	# Values are stored as text; SQLite does the float conversion. cast() turns any
+	# text into a number, so rows that do not look numeric are filtered out first.
+	query = "select SensorID, Date_n_Time, cast(%s as real) from %s" % (column, table)
+	clauses = ["%s glob '*[0-9]*'" % column, "%s not glob '*[^0-9.eE+ -]*'" % column]
+	args = []
+	if since is not None:
+		clauses.append("Date_n_Time >= ?")
+		args.append(since)
+	if until is not None:
+		clauses.append("Date_n_Time < ?")
+		args.append(until)
+	query += " where " + " and ".join(clauses)
+	query += " order by SensorID, Date_n_Time, id"
+
+	conn = sqlite3.connect(db_name)
+	try:
+		rows = conn.execute(query, args).fetchall()
+	finally:
+		conn.close()
+	if not rows:
+		return {}
+
+	sensors, dates, values = zip(*rows)
+	sensors = np.array(sensors, dtype=object)
+	times = _to_seconds(dates)
+	values = np.array(values, dtype=np.float64)
+
+	# Rows are sorted by sensor, so each sensor is one contiguous slice
+	names, starts = np.unique(sensors, return_index=True)
+	order = np.argsort(starts)
+	names, starts = names[order], starts[order]
+	bounds = np.append(starts, len(sensors))
+	return {
+		names[i]: (times[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]])
+		for i in range(len(names))
+	}
+
+def _pad_front(values, n):
+	return np.concatenate((np.full(n, np.nan), values))
+
+def rolling_mean(values, window=WINDOW):
+	values = np.asarray(values, dtype=np.float64)
+	if len(values) < window:
+		return np.full(len(values), np.nan)
+	view = np.lib.stride_tricks.sliding_window_view(values, window)
+	return _pad_front(view.mean(axis=-1), window - 1)
+
+def rolling_std(values, window=WINDOW):
+	values = np.asarray(values, dtype=np.float64)
+	if len(values) < window:
+		return np.full(len(values), np.nan)
+	view = np.lib.stride_tricks.sliding_window_view(values, window)
+	return _pad_front(view.std(axis=-1), window - 1)
+
+# Change per second between consecutive readings
+def rate_of_change(times, values):
+	times = np.asarray(times, dtype=np.float64)
+	values = np.asarray(values, dtype=np.float64)
+	if len(values) < 2:
+		return np.full(len(values), np.nan)
+	dt = np.diff(times)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		roc = np.where(dt > 0, np.diff(values) / dt, np.nan)
+	return _pad_front(roc, 1)
+
+# Z-score of each reading against the window of readings before it
+def zscore(values, window=WINDOW):
+	values = np.asarray(values, dtype=np.float64)
+	mean = _pad_front(rolling_mean(values, window)[:-1], 1)
+	std = _pad_front(rolling_std(values, window)[:-1], 1)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		return np.where(std > 0, (values - mean) / std, np.nan)
+
+def _ewma(values, alpha, initial):
+	# y[t] = (1 - alpha) * y[t-1] + alpha * x[t], solved in closed form per block
+	values = np.asarray(values, dtype=np.float64)
+	if alpha >= 1.0:
+		return values.copy()
+	decay = 1.0 - alpha
+	block = max(1, int(_MAX_EXPONENT / -np.log(decay)))
+	out = np.empty(len(values))
+	last = initial
+	for start in range(0, len(values), block):
+		chunk = values[start:start + block]
+		powers = decay ** np.arange(1, len(chunk) + 1)
+		out[start:start + len(chunk)] = powers * (last + alpha * np.cumsum(chunk / powers))
+		last = out[start + len(chunk) - 1]
+	return out
+
+# EWMA mean/variance and flags for readings that deviate from the previous EWMA.
+# No flags until `warmup` readings have been seen (`seen0` of them in earlier batches),
+# otherwise the near-zero starting variance turns ordinary noise into alerts.
+def ewma_flags(values, alpha=EWMA_ALPHA, threshold=EWMA_THRESHOLD, mean0=None, var0=0.0,
+		warmup=WINDOW, seen0=0):
+	values = np.asarray(values, dtype=np.float64)
+	if len(values) == 0:
+		empty = np.empty(0)
+		return empty, empty, np.zeros(0, dtype=bool)
+	if mean0 is None:
+		mean0 = values[0]
+	mean = _ewma(values, alpha, mean0)
+	prev_mean = np.concatenate(([mean0], mean[:-1]))
+	dev = values - prev_mean
+	var = _ewma((1.0 - alpha) * dev * dev, alpha, var0)
+	prev_std = np.sqrt(np.concatenate(([var0], var[:-1])))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		flags = np.where(prev_std > 0, np.abs(dev) / prev_std > threshold, False)
+	flags &= seen0 + np.arange(len(values)) >= warmup
+	return mean, var, flags
+
+# All statistics and anomaly flags for one sensor series
+def analyse(times, values, window=WINDOW, z_threshold=Z_THRESHOLD,
+		alpha=EWMA_ALPHA, ewma_threshold=EWMA_THRESHOLD):
+	z = zscore(values, window)
+	with np.errstate(invalid="ignore"):
+		z_flags = np.abs(z) > z_threshold
+	ewma, ewma_var, e_flags = ewma_flags(values, alpha, ewma_threshold, warmup=window)
+	return {
+		"mean": rolling_mean(values, window),
+		"std": rolling_std(values, window),
+		"rate": rate_of_change(times, values),
+		"zscore": z,
+		"z_anomaly": z_flags,
+		"ewma": ewma,
+		"ewma_anomaly": e_flags,
+		"anomaly": z_flags | e_flags,
+	}
+
+def analyse_window(metric, since=None, until=None, db_name=DB_Name, **kwargs):
+	return {
+		sensor: analyse(times, values, **kwargs)
+		for sensor, (times, values) in load_window(metric, since, until, db_name).items()
+	}
+
+
+class StreamingDetector():
+	"""Runs the same detectors on each ingest batch, keeping per-sensor state between batches."""
+
+	def __init__(self, window=WINDOW, z_threshold=Z_THRESHOLD,
+			alpha=EWMA_ALPHA, ewma_threshold=EWMA_THRESHOLD):
+		self.window = window
+		self.z_threshold = z_threshold
+		self.alpha = alpha
+		self.ewma_threshold = ewma_threshold
+		self.lock = threading.Lock()
+		self.pending = []
+		# (metric, sensor) -> (tail of last values, ewma mean, ewma variance, readings seen)
+		self.state = {}
+
+	def add(self, metric, sensor, date, value):
+		value = _to_float(value)
+		if np.isnan(value):
+			return
+		with self.lock:
+			self.pending.append((metric, sensor, date, value))
+
+	def flush(self):
+		with self.lock:
+			batch, self.pending = self.pending, []
+
+		groups = {}
+		for metric, sensor, date, value in batch:
+			groups.setdefault((metric, sensor), []).append((date, value))
+
+		anomalies = []
+		for key, readings in groups.items():
+			dates = [r[0] for r in readings]
+			values = np.array([r[1] for r in readings])
+			tail, mean0, var0, seen0 = self.state.get(key, (np.empty(0), None, 0.0, 0))
+
+			series = np.concatenate((tail, values))
+			z = zscore(series, self.window)[len(tail):]
+			with np.errstate(invalid="ignore"):
+				z_flags = np.abs(z) > self.z_threshold
+			mean, var, e_flags = ewma_flags(values, self.alpha, self.ewma_threshold, mean0, var0,
+				warmup=self.window, seen0=seen0)
+			self.state[key] = (series[-self.window:], mean[-1], var[-1], seen0 + len(values))
+
+			for i in np.flatnonzero(z_flags | e_flags):
+				anomalies.append({
+					"Metric": key[0],
+					"Sensor_ID": key[1],
+					"Date": dates[i],
+					"Value": float(values[i]),
+					"ZScore": None if np.isnan(z[i]) else float(z[i]),
+					"EWMA": float(mean[i - 1]) if i > 0 else (None if mean0 is None else float(mean0)),
+					"Detectors": [name for name, hit in (("zscore", z_flags[i]), ("ewma", e_flags[i])) if hit],
+				})
+		return anomalies
+
+
+# Function to publish anomalies to the alerts topic
+def publish_anomalies(client, anomalies, topic=ALERT_Topic):
+	for anomaly in anomalies:
+		client.publish(topic, json.dumps(anomaly))
+	if anomalies:
+		print("Published %d anomalies to %s" % (len(anomalies), topic))
+
+
+if __name__ == "__main__":
+	for metric in Metric_Tables:
+		for sensor, result in analyse_window(metric).items():
+			flagged = int(result["anomaly"].sum())
+			print("%s / %s: %d readings, %d anomalies" % (metric, sensor, len(result["anomaly"]), flagged))
@@ -0,0 +1,72 @@
+import hashlib
+import threading
+import time
+from collections import deque
+
+# Dedup window settings
+BUCKET_SECONDS = 60
+WINDOW_BUCKETS = 10
+MAX_KEYS = 100000
+
+
+# Key for one reading; digest keeps memory per key small and fixed
+def make_key(metric, sensor, date, value):
+	raw = "\x1f".join(str(part) for part in (metric, sensor, date, value))
+	return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class SlidingWindowDedup():
+	"""Remembers recently seen readings in time buckets; old buckets are dropped as the window slides."""
+
+	def __init__(self, bucket_seconds=BUCKET_SECONDS, window_buckets=WINDOW_BUCKETS, max_keys=MAX_KEYS):
+		self.bucket_seconds = bucket_seconds
+		self.window_buckets = window_buckets
+		self.max_keys = max_keys
+		self.lock = threading.Lock()
+		# (bucket number, set of keys), oldest first
+		self.buckets = deque()
+		self.size = 0
+		self.received = 0
+		self.window_duplicates = 0
+		self.db_duplicates = 0
+
+	def _expire(self, now):
+		current = int(now // self.bucket_seconds)
+		while self.buckets and self.buckets[0][0] <= current - self.window_buckets:
+			self.size -= len(self.buckets.popleft()[1])
+		# Keep memory bounded even if a burst fills the window early
+		while self.buckets and self.size > self.max_keys:
+			self.size -= len(self.buckets.popleft()[1])
+		if not self.buckets or self.buckets[-1][0] != current:
+			self.buckets.append((current, set()))
+
+	def is_duplicate(self, key):
+		with self.lock:
+			self._expire(time.monotonic())
+			self.received += 1
+			if any(key in keys for _, keys in self.buckets):
+				self.window_duplicates += 1
+				return True
+			return False
+
+	def remember(self, key):
+		with self.lock:
+			self._expire(time.monotonic())
+			self.buckets[-1][1].add(key)
+			self.size += 1
+
+	# Called when the DB unique index rejected a reading the window did not catch
+	def count_db_duplicate(self):
+		with self.lock:
+			self.db_duplicates += 1
+
+	def stats(self):
+		with self.lock:
+			duplicates = self.window_duplicates + self.db_duplicates
+			return {
+				"received": self.received,
+				"window_duplicates": self.window_duplicates,
+				"db_duplicates": self.db_duplicates,
+				"duplicate_rate": duplicates / self.received if self.received else 0.0,
+				"window_keys": self.size,
+			}